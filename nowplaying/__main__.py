@@ -32,7 +32,7 @@ def run_bootstrap(bundledir=None):
     socket.setdefaulttimeout(5.0)
     logpath = nowplaying.bootstrap.setuplogging(rotate=True)
     logging.info('starting up v%s',
-                 nowplaying.version.get_versions()['version'])
+                 nowplaying.__version__)
     nowplaying.upgrade.upgrade(bundledir=bundledir)
 
     # fail early if metadatadb can't be configured
@@ -67,8 +67,7 @@ def main():
     icon = QIcon(str(config.iconfile))
     qapp.setWindowIcon(icon)
     exitval = qapp.exec_()
-    logging.info('shutting down v%s',
-                 nowplaying.version.get_versions()['version'])
+    # Tray.cleanquit() has already logged and stopped logging
     sys.exit(exitval)
 
 
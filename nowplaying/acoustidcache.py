@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+''' local cache of acoustid fingerprints and lookups '''
+
+import collections
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import sqlite3
+import time
+
+from PySide6.QtCore import QStandardPaths  # pylint: disable=no-name-in-module
+
+FINGERPRINTTABLEDEF = '''
+CREATE TABLE IF NOT EXISTS fingerprints
+(filename TEXT NOT NULL,
+ mtime INTEGER NOT NULL,
+ size INTEGER NOT NULL,
+ duration REAL NOT NULL,
+ fingerprint TEXT NOT NULL,
+ PRIMARY KEY(filename, mtime, size)
+ );
+'''
+
+LOOKUPTABLEDEF = '''
+CREATE TABLE IF NOT EXISTS lookups
+(fphash TEXT PRIMARY KEY,
+ results TEXT NOT NULL,
+ timestamp INTEGER NOT NULL
+ );
+'''
+
+# how long to trust an answer from acoustid
+LOOKUP_TTL = 30 * 24 * 60 * 60
+
+MAX_FINGERPRINT_LRU = 1024
+
+
+class AcoustidCache:
+    ''' remember fingerprints and acoustid answers so that
+        recognizing the same file again skips fpcalc and the network '''
+
+    def __init__(self, cachedir=None):
+        if not cachedir:
+            self.cachedir = pathlib.Path(
+                QStandardPaths.standardLocations(
+                    QStandardPaths.CacheLocation)[0]).joinpath(
+                        'acoustidcache')
+        else:
+            self.cachedir = pathlib.Path(cachedir)
+
+        self.databasefile = self.cachedir.joinpath('acoustidcachev1.db')
+        self._fingerprintlru = collections.OrderedDict()
+        self.setup_sql()
+
+    def setup_sql(self):
+        ''' create the database '''
+        self.cachedir.resolve().mkdir(parents=True, exist_ok=True)
+        with sqlite3.connect(self.databasefile) as connection:
+            cursor = connection.cursor()
+            try:
+                cursor.execute(FINGERPRINTTABLEDEF)
+                cursor.execute(LOOKUPTABLEDEF)
+            except sqlite3.OperationalError as error:
+                logging.error('Cannot create acoustid cache: %s', error)
+
+    @staticmethod
+    def _filekey(filename):
+        try:
+            stat = os.stat(filename)
+        except OSError as error:
+            logging.debug(error)
+            return None
+        return str(filename), stat.st_mtime_ns, stat.st_size
+
+    @staticmethod
+    def _fphash(fingerprint):
+        return hashlib.blake2b(str(fingerprint).encode('utf-8'),
+                               digest_size=16).hexdigest()
+
+    def _remember_fingerprint(self, filekey, data):
+        self._fingerprintlru[filekey] = data
+        if len(self._fingerprintlru) > MAX_FINGERPRINT_LRU:
+            self._fingerprintlru.popitem(last=False)
+
+    def get_fingerprint(self, filename):
+        ''' return (duration, fingerprint) if this exact file has been seen '''
+        if not (filekey := self._filekey(filename)):
+            return None
+
+        if data := self._fingerprintlru.get(filekey):
+            self._fingerprintlru.move_to_end(filekey)
+            return data
+
+        with sqlite3.connect(self.databasefile) as connection:
+            cursor = connection.cursor()
+            try:
+                cursor.execute(
+                    '''SELECT duration, fingerprint FROM fingerprints
+ WHERE filename=? AND mtime=? AND size=?;''', filekey)
+            except sqlite3.OperationalError as error:
+                logging.debug(error)
+                return None
+            data = cursor.fetchone()
+
+        if data:
+            self._remember_fingerprint(filekey, data)
+        return data
+
+    def put_fingerprint(self, filename, duration, fingerprint):
+        ''' remember the fingerprint for this version of the file '''
+        if not (filekey := self._filekey(filename)):
+            return
+
+        with sqlite3.connect(self.databasefile) as connection:
+            cursor = connection.cursor()
+            try:
+                # older versions of the file will never match again
+                cursor.execute('DELETE FROM fingerprints WHERE filename=?;',
+                               (filekey[0], ))
+                cursor.execute(
+                    '''INSERT INTO
+ fingerprints(filename, mtime, size, duration, fingerprint)
+ VALUES (?,?,?,?,?);''', (*filekey, duration, fingerprint))
+            except sqlite3.OperationalError as error:
+                logging.debug(error)
+        self._remember_fingerprint(filekey, (duration, fingerprint))
+
+    def get_lookup(self, fingerprint):
+        ''' return the cached acoustid results for a fingerprint '''
+        fphash = self._fphash(fingerprint)
+        with sqlite3.connect(self.databasefile) as connection:
+            cursor = connection.cursor()
+            try:
+                cursor.execute(
+                    'SELECT results, timestamp FROM lookups WHERE fphash=?;',
+                    (fphash, ))
+                if not (row := cursor.fetchone()):
+                    return None
+                if time.time() - row[1] > LOOKUP_TTL:
+                    cursor.execute('DELETE FROM lookups WHERE fphash=?;',
+                                   (fphash, ))
+                    return None
+            except sqlite3.OperationalError as error:
+                logging.debug(error)
+                return None
+        return json.loads(row[0])
+
+    def put_lookup(self, fingerprint, results):
+        ''' remember the acoustid results for a fingerprint '''
+        with sqlite3.connect(self.databasefile) as connection:
+            cursor = connection.cursor()
+            try:
+                cursor.execute(
+                    '''INSERT OR REPLACE INTO
+ lookups(fphash, results, timestamp) VALUES (?,?,?);''',
+                    (self._fphash(fingerprint), json.dumps(results),
+                     int(time.time())))
+            except sqlite3.OperationalError as error:
+                logging.debug(error)
@@ -3,10 +3,15 @@
 
 import logging
 import logging.handlers
+import os
 import pathlib
+import queue
 
 from PySide6.QtCore import QCoreApplication, QStandardPaths  # pylint: disable=no-name-in-module
 
+# logfile -> (pid, QueueHandler, QueueListener)
+LOGLISTENERS = {}
+
 
 def set_qt_names(app=None, appname='NowPlaying'):
     ''' bootstrap Qt for configuration '''
@@ -20,6 +25,26 @@ def set_qt_names(app=None, appname='NowPlaying'):
     app.setApplicationName(appname)
 
 
+def stoplogging():
+    ''' stop the log listeners owned by this process, flushing
+        anything still queued to disk.
+
+        every process that calls setuplogging() must call this on its
+        way out (the tray from cleanquit(), subprocesses before they
+        return); multiprocessing children skip atexit.  forked children
+        should call setuplogging() before logging anything since the
+        listener they inherit never writes. '''
+    for logfilename, (pid, queuehandler,
+                      listener) in list(LOGLISTENERS.items()):
+        if pid != os.getpid():
+            continue
+        logging.getLogger().removeHandler(queuehandler)
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+        del LOGLISTENERS[logfilename]
+
+
 def setuplogging(logdir=None, logname='debug.log', rotate=False):
     ''' configure logging '''
     besuretorotate = False
@@ -40,18 +65,44 @@ def setuplogging(logdir=None, logname='debug.log', rotate=False):
     if logfile.exists() and rotate:
         besuretorotate = True
 
+    # calling this more than once per process (or after a fork)
+    # should replace the handler for this file rather than stack
+    # another one on top of it
+    rootlogger = logging.getLogger()
+    firsttime = not rootlogger.handlers
+    logfilename = os.path.abspath(logfile)
+    if logfilename in LOGLISTENERS:
+        pid, queuehandler, listener = LOGLISTENERS.pop(logfilename)
+        rootlogger.removeHandler(queuehandler)
+        # a forked child inherits the listener but not its thread
+        if pid == os.getpid():
+            listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+
     logfhandler = logging.handlers.RotatingFileHandler(filename=logfile,
                                                        backupCount=10,
                                                        encoding='utf-8')
     if besuretorotate:
         logfhandler.doRollover()
 
-    logging.basicConfig(
-        format=
-        '%(asctime)s %(process)d %(processName)s/%(threadName)s %(module)s:%(funcName)s:%(lineno)d '
-        + '%(levelname)s %(message)s',
-        datefmt='%Y-%m-%dT%H:%M:%S%z',
-        handlers=[logfhandler],
-        level=logging.DEBUG)
+    logfhandler.setFormatter(
+        logging.Formatter(
+            '%(asctime)s %(process)d %(processName)s/%(threadName)s '
+            + '%(module)s:%(funcName)s:%(lineno)d '
+            + '%(levelname)s %(message)s',
+            datefmt='%Y-%m-%dT%H:%M:%S%z'))
+
+    # file I/O happens on the listener's thread so that
+    # callers only pay for an enqueue
+    logqueue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(logqueue, logfhandler)
+    listener.start()
+    queuehandler = logging.handlers.QueueHandler(logqueue)
+    rootlogger.addHandler(queuehandler)
+    LOGLISTENERS[logfilename] = (os.getpid(), queuehandler, listener)
+
+    if firsttime:
+        rootlogger.setLevel(logging.DEBUG)
     logging.captureWarnings(True)
     return logpath
@@ -3,12 +3,13 @@
 ''' image cache '''
 
 import concurrent.futures
+import hashlib
+import multiprocessing
+import os
 import pathlib
 import random
 import sqlite3
 import threading
-import time
-import uuid
 
 import logging
 import logging.config
@@ -22,7 +23,6 @@ from PySide6.QtCore import QStandardPaths  # pylint: disable=no-name-in-module
 
 import nowplaying.bootstrap
 import nowplaying.utils
-import nowplaying.version
 
 TABLEDEF = '''
 CREATE TABLE artistsha
@@ -34,8 +34,37 @@ CREATE TABLE artistsha
  );
 '''
 
+INDEXDEFS = [
+    '''CREATE INDEX IF NOT EXISTS idx_artist_type_ck
+ ON artistsha(artist, imagetype) WHERE cachekey IS NOT NULL;''',
+    '''CREATE INDEX IF NOT EXISTS idx_nullck_ts
+ ON artistsha(timestamp DESC) WHERE cachekey IS NULL;''',
+    'CREATE INDEX IF NOT EXISTS idx_cachekey ON artistsha(cachekey);',
+]
+
+SQLPRAGMAS = [
+    'PRAGMA journal_mode=WAL;',
+    'PRAGMA synchronous=NORMAL;',
+    'PRAGMA temp_store=MEMORY;',
+    'PRAGMA cache_size=-20000;',
+    'PRAGMA mmap_size=268435456;',
+]
+
 MAX_FANART_DOWNLOADS = 50
 
+# imagetype -> (setting, default) for how many images to queue
+MAXART_KEYS = {
+    'artistbanner': ('artistextras/banners', 3),
+    'artistfanart': ('artistextras/fanart', 20),
+    'artistlogo': ('artistextras/logos', 3),
+    'artistthumb': ('artistextras/thumbnails', 3),
+}
+
+# the webserver and other processes make their own ImageCache, so
+# their wakeups never reach queue_process.  keep polling as often as
+# before the wakeup event existed
+QUEUE_WAKEUP_TIMEOUT = 2
+
 
 class ImageCache:
     ''' database operations for caches '''
@@ -58,24 +87,93 @@ class ImageCache:
         if not self.databasefile.exists():
             initialize = True
         self.httpcachefile = self.cachedir.joinpath('http')
+        self._connection = None
+        self._connectionpid = None
+        self._connectionfileid = None
+        self._dblock = threading.RLock()
         self.cache = diskcache.Cache(
             directory=self.cachedir.joinpath('diskcache'),
             eviction_policy='least-frequently-used',
             size_limit=sizelimit * 1024 * 1024 * 1024)
         if initialize:
             self.setup_sql(initialize=True)
+        else:
+            self._setup_indexes()
         self.session = None
-        self.logpath = None
         self.stopevent = stopevent
+        # fill_queue and friends run in a different process than
+        # queue_process, so this has to be a multiprocessing Event
+        self._workevent = multiprocessing.Event()
+
+    def __getstate__(self):
+        ''' sqlite connections and locks cannot cross process boundaries '''
+        state = self.__dict__.copy()
+        state['_connection'] = None
+        state['_connectionpid'] = None
+        state['_connectionfileid'] = None
+        del state['_dblock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._dblock = threading.RLock()
 
     @staticmethod
     def _normalize_artist(artist):
         return normality.normalize(artist).replace(' ', '')
 
+    def _getfileid(self):
+        ''' identify the db file on disk so a replaced one is noticed '''
+        try:
+            stat = self.databasefile.stat()
+        except OSError:
+            return None
+        return stat.st_dev, stat.st_ino
+
+    def _getconnection(self):
+        ''' return this process' connection, opening it on first use
+            or when the db file has been deleted and recreated
+            (e.g., by another process clearing the cache) '''
+        with self._dblock:
+            if (self._connection and self._connectionpid == os.getpid()
+                    and self._connectionfileid == self._getfileid()):
+                return self._connection
+
+            self._closeconnection()
+            self._connection = sqlite3.connect(self.databasefile,
+                                               check_same_thread=False,
+                                               isolation_level=None)
+            self._connection.row_factory = sqlite3.Row
+            for pragma in SQLPRAGMAS:
+                self._connection.execute(pragma)
+            self._connectionpid = os.getpid()
+            self._connectionfileid = self._getfileid()
+            return self._connection
+
+    def _closeconnection(self):
+        ''' drop the connection, e.g., because the db file went away '''
+        with self._dblock:
+            if self._connection and self._connectionpid == os.getpid():
+                self._connection.close()
+            self._connection = None
+            self._connectionpid = None
+            self._connectionfileid = None
+
+    def _setup_indexes(self):
+        ''' make sure the queue and random lookups are indexed '''
+        with self._dblock:
+            cursor = self._getconnection().cursor()
+            try:
+                for indexdef in INDEXDEFS:
+                    cursor.execute(indexdef)
+            except sqlite3.OperationalError as error:
+                logging.debug(error)
+
     def setup_sql(self, initialize=False):
         ''' create the database '''
 
         if initialize and self.databasefile.exists():
+            self._closeconnection()
             self.databasefile.unlink()
 
         if self.databasefile.exists():
@@ -84,15 +182,16 @@ class ImageCache:
         logging.info('Create imagecache db file %s', self.databasefile)
         self.databasefile.resolve().parent.mkdir(parents=True, exist_ok=True)
 
-        with sqlite3.connect(self.databasefile) as connection:
-
-            cursor = connection.cursor()
+        with self._dblock:
+            self._closeconnection()
+            cursor = self._getconnection().cursor()
 
             try:
                 cursor.execute(TABLEDEF)
             except sqlite3.OperationalError:
                 cursor.execute('DROP TABLE artistsha;')
                 cursor.execute(TABLEDEF)
+            self._setup_indexes()
 
         logging.debug('initialize imagecache')
         self.cache.clear()
@@ -106,18 +205,29 @@ class ImageCache:
             self.setup_sql()
             return None
 
-        with sqlite3.connect(self.databasefile) as connection:
-            connection.row_factory = sqlite3.Row
-            cursor = connection.cursor()
+        with self._dblock:
+            cursor = self._getconnection().cursor()
             try:
+                cursor.execute(
+                    '''SELECT COUNT(*) FROM artistsha
+ WHERE artist=?
+ AND imagetype=?
+ AND cachekey NOT NULL;''', (
+                        normalartist,
+                        imagetype,
+                    ))
+                count = cursor.fetchone()[0]
+                if not count:
+                    return None
                 cursor.execute(
                     '''SELECT * FROM artistsha
  WHERE artist=?
  AND imagetype=?
  AND cachekey NOT NULL
- ORDER BY random() LIMIT 1;''', (
+ LIMIT 1 OFFSET ?;''', (
                         normalartist,
                         imagetype,
+                        random.randrange(count),
                     ))
             except sqlite3.OperationalError as error:
                 msg = str(error)
@@ -127,17 +237,12 @@ class ImageCache:
                               error_name)
                 return None
 
-            row = cursor.fetchone()
-            if not row:
+            data = cursor.fetchone()
+            if not data:
                 return None
 
-            data = {
-                'artist': row['artist'],
-                'cachekey': row['cachekey'],
-                'url': row['url'],
-            }
-            logging.debug('random got %s/%s/%s', imagetype, row['artist'],
-                          row['cachekey'])
+            logging.debug('random got %s/%s/%s', imagetype, data['artist'],
+                          data['cachekey'])
 
         return data
 
@@ -162,9 +267,8 @@ class ImageCache:
             self.setup_sql()
             return None
 
-        with sqlite3.connect(self.databasefile) as connection:
-            connection.row_factory = sqlite3.Row
-            cursor = connection.cursor()
+        with self._dblock:
+            cursor = self._getconnection().cursor()
             try:
                 cursor.execute('''SELECT * FROM artistsha WHERE url=?''',
                                (url, ))
@@ -176,14 +280,7 @@ class ImageCache:
                               error_name)
                 return None
 
-            if row := cursor.fetchone():
-                data = {
-                    'artist': row['artist'],
-                    'cachekey': row['cachekey'],
-                    'imagetype': row['imagetype'],
-                    'url': row['url'],
-                    'timestamp': row['timestamp']
-                }
+            data = cursor.fetchone()
         return data
 
     def find_cachekey(self, cachekey):
@@ -194,95 +291,65 @@ class ImageCache:
             self.setup_sql()
             return None
 
-        with sqlite3.connect(self.databasefile) as connection:
-            connection.row_factory = sqlite3.Row
-            cursor = connection.cursor()
+        with self._dblock:
+            cursor = self._getconnection().cursor()
             try:
                 cursor.execute('''SELECT * FROM artistsha WHERE cachekey=?''',
                                (cachekey, ))
             except sqlite3.OperationalError:
                 return None
 
-            if row := cursor.fetchone():
-                data = {
-                    'artist': row['artist'],
-                    'cachekey': row['cachekey'],
-                    'url': row['url'],
-                    'imagetype': row['imagetype'],
-                    'timestamp': row['timestamp']
-                }
+            data = cursor.fetchone()
 
         return data
 
+    @staticmethod
+    def _getmaxart(config, imagetype):
+        ''' how many images of a type to queue '''
+        key, default = MAXART_KEYS.get(imagetype, MAXART_KEYS['artistfanart'])
+        return config.cparser.value(key, defaultValue=default, type=int)
+
     def fill_queue(self, config, artist, imagetype, urllist):
         ''' fill the queue '''
 
         if not self.databasefile.exists():
             self.setup_sql()
 
-        if 'logo' in imagetype:
-            maxart = config.cparser.value('artistextras/logos',
-                                          defaultValue=3,
-                                          type=int)
-        elif 'banner' in imagetype:
-            maxart = config.cparser.value('artistextras/banners',
-                                          defaultValue=3,
-                                          type=int)
-        elif 'thumb' in imagetype:
-            maxart = config.cparser.value('artistextras/thumbnails',
-                                          defaultValue=3,
-                                          type=int)
-        else:
-            maxart = config.cparser.value('artistextras/fanart',
-                                          defaultValue=20,
-                                          type=int)
+        maxart = self._getmaxart(config, imagetype)
 
-        logging.debug('Putting %s unfiltered for %s/%s',
-                      min(len(urllist), maxart), imagetype, artist)
+        if len(urllist) > maxart:
+            urllist = random.sample(urllist, maxart)
+
+        logging.debug('Putting %s unfiltered for %s/%s', len(urllist),
+                      imagetype, artist)
         normalartist = self._normalize_artist(artist)
-        for url in random.sample(urllist, min(len(urllist), maxart)):
-            self.put_db_url(artist=normalartist, imagetype=imagetype, url=url)
+        self.put_db_urls(artist=normalartist,
+                         imagetype=imagetype,
+                         urllist=urllist)
 
     def get_next_dlset(self):
         ''' update metadb '''
 
-        def dict_factory(cursor, row):
-            d = {}
-            for idx, col in enumerate(cursor.description):
-                d[col[0]] = row[idx]
-            return d
-
         dataset = None
         if not self.databasefile.exists():
             logging.error('imagecache does not exist yet?')
             return None
 
-        with sqlite3.connect(self.databasefile) as connection:
-            connection.row_factory = dict_factory
-            cursor = connection.cursor()
+        with self._dblock:
+            cursor = self._getconnection().cursor()
+            # thumbs, banners, and logos are small and are what
+            # gets displayed first, so hand those out ahead of fanart
             try:
                 cursor.execute(
                     '''SELECT * FROM artistsha WHERE cachekey IS NULL
- AND EXISTS (SELECT * FROM artistsha
- WHERE imagetype='artistthumb' OR imagetype='artistbanner' OR imagetype='artistlogo')
- ORDER BY TIMESTAMP DESC''')
+ ORDER BY imagetype IN ('artistthumb', 'artistbanner', 'artistlogo') DESC,
+ TIMESTAMP DESC''')
             except sqlite3.OperationalError as error:
                 logging.debug(error)
                 return None
 
             dataset = cursor.fetchall()
 
-            if not dataset:
-                try:
-                    cursor.execute(
-                        '''SELECT * FROM artistsha WHERE cachekey IS NULL
- ORDER BY TIMESTAMP DESC''')
-                except sqlite3.OperationalError as error:
-                    logging.debug(error)
-                    return None
-
-                dataset = cursor.fetchall()
-
         return dataset
 
     def put_db_cachekey(self, artist, url, imagetype, cachekey=None):
@@ -293,9 +360,8 @@ class ImageCache:
             return
 
         normalartist = self._normalize_artist(artist)
-        with sqlite3.connect(self.databasefile) as connection:
-            connection.row_factory = sqlite3.Row
-            cursor = connection.cursor()
+        with self._dblock:
+            cursor = self._getconnection().cursor()
 
             sql = '''
 INSERT OR REPLACE INTO
@@ -323,12 +389,11 @@ INSERT OR REPLACE INTO
             logging.error('imagecache does not exist yet?')
             return
 
-        with sqlite3.connect(self.databasefile) as connection:
-            connection.row_factory = sqlite3.Row
-            cursor = connection.cursor()
+        with self._dblock:
+            cursor = self._getconnection().cursor()
 
             sql = '''
-INSERT INTO
+INSERT OR IGNORE INTO
 artistsha(url, artist, imagetype)
 VALUES (?,?,?);
 '''
@@ -338,13 +403,50 @@ VALUES (?,?,?);
                     artist,
                     imagetype,
                 ))
-            except sqlite3.IntegrityError as error:
-                if 'UNIQUE' in str(error):
-                    logging.debug('Duplicate URL, ignoring')
-                else:
-                    logging.debug(error)
             except sqlite3.OperationalError as error:
                 logging.debug(error)
+                return
+
+            if not cursor.rowcount:
+                logging.debug('Duplicate URL, ignoring')
+                return
+        self._workevent.set()
+
+    def put_db_urls(self, artist, urllist, imagetype=None):
+        ''' update metadb with a batch of urls in one transaction '''
+
+        if not self.databasefile.exists():
+            logging.error('imagecache does not exist yet?')
+            return
+
+        sql = '''
+INSERT OR IGNORE INTO
+artistsha(url, artist, imagetype)
+VALUES (?,?,?);
+'''
+        with self._dblock:
+            connection = self._getconnection()
+            changes = connection.total_changes
+            try:
+                connection.execute('BEGIN;')
+                connection.executemany(sql, [(
+                    url,
+                    artist,
+                    imagetype,
+                ) for url in urllist])
+                connection.execute('COMMIT;')
+            except sqlite3.Error as error:
+                logging.debug(error)
+                return
+            finally:
+                # the connection is shared, so never leave it
+                # stuck inside a transaction
+                if connection.in_transaction:
+                    connection.execute('ROLLBACK;')
+
+            if connection.total_changes == changes:
+                return
+        self._workevent.set()
 
     def erase_url(self, url):
         ''' update metadb '''
@@ -354,9 +456,8 @@ VALUES (?,?,?);
             return
 
         logging.debug('Erasing %s', url)
-        with sqlite3.connect(self.databasefile) as connection:
-            connection.row_factory = sqlite3.Row
-            cursor = connection.cursor()
+        with self._dblock:
+            cursor = self._getconnection().cursor()
             logging.debug('Delete %s for reasons', url)
             try:
                 cursor.execute('DELETE FROM artistsha WHERE url=?;', (url, ))
@@ -370,45 +471,45 @@ VALUES (?,?,?);
             self.setup_sql()
             return
 
-        data = self.find_cachekey(cachekey)
-        if not data:
-            return
-
         # It was retrieved once before so put it back in the queue
         # if it fails in the queue, it will be deleted
-        logging.debug('Cache %s  url %s has left cache, requeue it.', cachekey,
-                      data['url'])
-        self.erase_url(data['url'])
-        self.put_db_url(artist=data['artist'],
-                        imagetype=data['imagetype'],
-                        url=data['url'])
-        return
+        with self._dblock:
+            cursor = self._getconnection().cursor()
+            try:
+                cursor.execute(
+                    '''UPDATE artistsha
+ SET cachekey=NULL, timestamp=CURRENT_TIMESTAMP
+ WHERE cachekey=?;''', (cachekey, ))
+            except sqlite3.OperationalError as error:
+                logging.debug(error)
+                return
+
+            if cursor.rowcount:
+                logging.debug('Cache %s has left cache, requeue it.',
+                              cachekey)
+                self._workevent.set()
 
     def image_dl(self, imagedict):
         ''' fetch an image and store it '''
-        nowplaying.bootstrap.setuplogging(logdir=self.logpath, rotate=False)
-        threading.current_thread().name = 'ICFollower'
-        logging.getLogger('requests_cache').setLevel(logging.CRITICAL + 1)
-        logging.getLogger('aiosqlite').setLevel(logging.CRITICAL + 1)
-        version = nowplaying.version.get_versions()['version']
-        session = requests_cache.CachedSession(self.httpcachefile)
-        cachekey = str(uuid.uuid4())
-
-        logging.debug("Downloading %s %s", cachekey, imagedict['url'])
+        logging.debug("Downloading %s", imagedict['url'])
         try:
-            headers = {
-                'user-agent':
-                f'whatsnowplaying/{version}'
-                ' +https://whatsnowplaying.github.io/'
-            }
-            dlimage = session.get(imagedict['url'], timeout=5, headers=headers)
+            dlimage = self.session.get(imagedict['url'], timeout=5)
         except Exception as error:  # pylint: disable=broad-except
             logging.debug('image_dl: %s %s', imagedict['url'], error)
             self.erase_url(imagedict['url'])
             return
         if dlimage.status_code == 200:
             image = nowplaying.utils.image2png(dlimage.content)
-            self.cache[cachekey] = image
+            if not image:
+                logging.debug('image_dl: %s is not an image',
+                              imagedict['url'])
+                self.erase_url(imagedict['url'])
+                return
+            # key on the content so that the same image from
+            # several urls only takes up space in the cache once
+            cachekey = hashlib.blake2b(image, digest_size=16).hexdigest()
+            if cachekey not in self.cache:
+                self.cache[cachekey] = image
             self.put_db_cachekey(artist=imagedict['artist'],
                                  url=imagedict['url'],
                                  imagetype=imagedict['imagetype'],
@@ -425,55 +526,56 @@ VALUES (?,?,?);
 
         threading.current_thread().name = 'ICQueue'
         nowplaying.bootstrap.setuplogging(logdir=logpath, rotate=False)
-        self.logpath = logpath
+        logging.getLogger('requests_cache').setLevel(logging.CRITICAL + 1)
+        logging.getLogger('aiosqlite').setLevel(logging.CRITICAL + 1)
         self.erase_url('STOPWNP')
+        version = nowplaying.__version__
+        self.session = requests_cache.CachedSession(self.httpcachefile)
+        self.session.headers['user-agent'] = (
+            f'whatsnowplaying/{version}'
+            ' +https://whatsnowplaying.github.io/')
         endloop = False
-        oldset = []
-        with concurrent.futures.ProcessPoolExecutor(
-                max_workers=maxworkers) as executor:
+        # downloads are network bound and requests releases the GIL,
+        # so threads avoid pickling self for every image
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=maxworkers,
+                thread_name_prefix='ICFollower') as executor:
             while not endloop and not self.stopevent.is_set():
+                self._workevent.wait(timeout=QUEUE_WAKEUP_TIMEOUT)
+                self._workevent.clear()
+                if not self.databasefile.exists():
+                    self.setup_sql()
                 if dataset := self.get_next_dlset():
-                    # sometimes images are downloaded but not
-                    # written to sql yet so don't try to resend
-                    # same data
-                    newset = []
+                    # every download from the previous pass has finished
+                    # by now, so anything still queued needs another try
                     newdataset = []
                     for entry in dataset:
-                        newset.append({
-                            'url': entry['url'],
-                            'time': int(time.time())
-                        })
                         if entry['url'] == 'STOPWNP':
                             endloop = True
                             break
-                        oldcopy = oldset
-                        for oldentry in oldcopy:
-                            if int(time.time()) - oldentry['time'] > 180:
-                                oldset.remove(oldentry)
-                                logging.debug(
-                                    'removing %s from the previously processed queue',
-                                    oldentry['url'])
-                        if all(u['url'] != entry['url'] for u in oldset):
-                            logging.debug('skipping in-progress url %s ',
-                                          entry['url'])
-                        else:
-                            newdataset.append(entry)
-                    oldset = newset
+                        newdataset.append(entry)
 
                     if endloop:
                         break
 
-                    executor.map(self.image_dl, newdataset)
-                time.sleep(2)
-                if not self.databasefile.exists():
-                    self.setup_sql()
+                    futures = [
+                        executor.submit(self.image_dl, entry)
+                        for entry in newdataset
+                    ]
+                    for future in concurrent.futures.as_completed(futures):
+                        if error := future.exception():
+                            logging.error('image_dl failed: %s', error)
 
-        logging.debug('stopping download processes')
+        logging.debug('stopping download threads')
+        self.session.close()
+        self.session = None
         self.erase_url('STOPWNP')
+        nowplaying.bootstrap.stoplogging()
 
     def stop_process(self):
         ''' stop the bg ImageCache process'''
         logging.debug('imagecache stop_process called')
         self.put_db_url('STOPWNP', 'STOPWNP', imagetype='STOPWNP')
+        self._closeconnection()
         self.cache.close()
         logging.debug('WNP should be set')
@@ -172,14 +172,17 @@ class MetadataProcessors:  # pylint: disable=too-few-public-methods
                 'musicbrainz recordingid detected; attempting shortcuts')
             if any(meta not in self.metadata for meta in metalist):
                 addmeta = musicbrainz.recordingid(
-                    self.metadata['musicbrainzrecordingid'])
+                    self.metadata['musicbrainzrecordingid'],
+                    need_art=not self.metadata.get('coverimageraw'))
                 self.metadata = recognition_replacement(config=self.config,
                                                         metadata=self.metadata,
                                                         addmeta=addmeta)
         elif self.metadata.get('isrc'):
             logging.debug('Preprocessing with musicbrainz isrc')
             if any(meta not in self.metadata for meta in metalist):
-                addmeta = musicbrainz.isrc(self.metadata['isrc'])
+                addmeta = musicbrainz.isrc(
+                    self.metadata['isrc'],
+                    need_art=not self.metadata.get('coverimageraw'))
                 self.metadata = recognition_replacement(config=self.config,
                                                         metadata=self.metadata,
                                                         addmeta=addmeta)
@@ -204,7 +207,10 @@ class MetadataProcessors:  # pylint: disable=too-few-public-methods
             if provider:
                 try:
                     if addmeta := self.config.pluginobjs['recognition'][
-                            plugin].recognize(metadata=self.metadata):
+                            plugin].recognize(
+                                metadata=self.metadata,
+                                need_art=not self.metadata.get(
+                                    'coverimageraw')):
                         self.metadata = recognition_replacement(
                             config=self.config,
                             metadata=self.metadata,
@@ -2,8 +2,12 @@
 # pylint: disable=invalid-name
 ''' support for musicbrainz '''
 
+import concurrent.futures
+import copy
+import functools
 import os
 import sys
+import time
 
 import logging
 import logging.config
@@ -13,7 +17,70 @@ import musicbrainzngs
 
 import nowplaying.bootstrap
 import nowplaying.config
-import nowplaying.version
+
+PROVIDERINFO = (
+    'album',
+    'artist',
+    'artistwebsites',
+    'coverimageraw',
+    'date',
+    'label',
+    'title',
+)
+
+# cover art downloads overlap with the rest of the lookups.  one
+# pool for the whole process since a helper is made for every track
+COVERART_POOL = concurrent.futures.ThreadPoolExecutor(
+    max_workers=2, thread_name_prefix='MBCoverArt')
+
+
+@functools.lru_cache(maxsize=1)
+def _set_useragent(emailaddress):
+    ''' musicbrainzngs keeps a single, process-wide user agent so
+        only (re)set it when the email address changes '''
+    musicbrainzngs.set_useragent('whats-now-playing', nowplaying.__version__,
+                                 emailaddress)
+
+
+# neighbouring tracks tend to come from the same release, but there
+# is no reason to hang onto musicbrainz answers for long
+MB_CACHE_TTL = 15 * 60
+
+
+def _ttlbucket():
+    ''' changes every MB_CACHE_TTL seconds, expiring the caches below '''
+    return int(time.time() // MB_CACHE_TTL)
+
+
+@functools.lru_cache(maxsize=32)
+def _browse_releases_cached(recordingid, official, ttlbucket):  # pylint: disable=unused-argument
+    if official:
+        return musicbrainzngs.browse_releases(
+            recording=recordingid,
+            includes=['labels', 'artist-credits'],
+            release_status=['official'],
+            limit=100)
+    return musicbrainzngs.browse_releases(
+        recording=recordingid,
+        includes=['labels', 'artist-credits'],
+        limit=100)
+
+
+def _browse_releases(recordingid, official=True):
+    ''' every release of a recording in one page.  callers get
+        their own copy so they cannot damage the cached one '''
+    return copy.deepcopy(
+        _browse_releases_cached(recordingid, official, _ttlbucket()))
+
+
+@functools.lru_cache(maxsize=8)
+def _get_front_image_cached(releaseid, ttlbucket):  # pylint: disable=unused-argument
+    return musicbrainzngs.get_image(releaseid, 'front')
+
+
+def _get_front_image(releaseid):
+    ''' front cover for a release '''
+    return _get_front_image_cached(releaseid, _ttlbucket())
 
 
 class MusicBrainzHelper():
@@ -38,9 +105,7 @@ class MusicBrainzHelper():
             if not emailaddress:
                 emailaddress = 'aw@effectivemachines.com'
 
-            musicbrainzngs.set_useragent(
-                'whats-now-playing',
-                nowplaying.version.get_versions()['version'], emailaddress)
+            _set_useragent(emailaddress)
             self.emailaddressset = True
 
     def recognize(self, metadata):
@@ -62,7 +127,7 @@ class MusicBrainzHelper():
             addmeta = self.artistids(metadata['musicbrainzartistid'])
         return addmeta
 
-    def isrc(self, isrclist):
+    def isrc(self, isrclist, need_art=True):
         ''' lookup musicbrainz information based upon isrc '''
         if not self.config.cparser.value('musicbrainz/enabled', type=bool):
             return None
@@ -90,10 +155,11 @@ class MusicBrainzHelper():
         recordinglist = sorted(mbdata['isrc']['recording-list'],
                                key=lambda k: k['release-count'],
                                reverse=True)
-        return self.recordingid(recordinglist[0]['id'])
+        return self.recordingid(recordinglist[0]['id'], need_art=need_art)
 
-    def recordingid(self, recordingid):  # pylint: disable=too-many-branches, too-many-return-statements, too-many-statements
-        ''' lookup the musicbrainz information based upon recording id '''
+    def recordingid(self, recordingid, need_art=True):  # pylint: disable=too-many-branches, too-many-return-statements, too-many-statements
+        ''' lookup the musicbrainz information based upon recording id;
+            skip the cover art download if the caller has no use for it '''
         if not self.config.cparser.value('musicbrainz/enabled', type=bool):
             return None
 
@@ -118,23 +184,16 @@ class MusicBrainzHelper():
         def releaselookup_noartist(recordingid):
             mbdata = None
 
-            self._setemail()
-
             try:
-                mbdata = musicbrainzngs.browse_releases(
-                    recording=recordingid,
-                    includes=['labels', 'artist-credits'],
-                    release_status=['official'])
+                mbdata = _browse_releases(recordingid)
             except Exception as error:  # pylint: disable=broad-except
                 logging.debug('MusicBrainz threw an error: %s', error)
                 return None
 
             if 'release-count' not in mbdata or mbdata['release-count'] == 0:
                 try:
-                    mbdata = musicbrainzngs.browse_releases(
-                        recording=recordingid,
-                        includes=['labels', 'artist-credits'])
-                except Exception:  # pylint: disable=broad-except
+                    mbdata = _browse_releases(recordingid, official=False)
+                except Exception as error:  # pylint: disable=broad-except
                     logging.debug('MusicBrainz threw an error: %s', error)
                     return None
             return mbdata
@@ -190,6 +249,14 @@ class MusicBrainzHelper():
             return None
 
         release = mbdata[0]
+        coverfuture = None
+        if need_art and self.config.cparser.value(
+                'acoustidmb/fetchart', type=bool, defaultValue=True
+        ) and 'cover-art-archive' in release and 'artwork' in release[
+                'cover-art-archive'] and release['cover-art-archive'][
+                    'artwork']:
+            coverfuture = COVERART_POOL.submit(_get_front_image, release['id'])
+
         if 'title' in release:
             newdata['album'] = release['title']
         if 'date' in release:
@@ -198,17 +265,14 @@ class MusicBrainzHelper():
         if label:
             newdata['label'] = label
 
-        if 'cover-art-archive' in release and 'artwork' in release[
-                'cover-art-archive'] and release['cover-art-archive'][
-                    'artwork']:
+        newdata['artistwebsites'] = self._websites(
+            newdata['musicbrainzartistid'])
+
+        if coverfuture:
             try:
-                newdata['coverimageraw'] = musicbrainzngs.get_image(
-                    release['id'], 'front')
+                newdata['coverimageraw'] = coverfuture.result(timeout=10)
             except Exception as error:  # pylint: disable=broad-except
                 logging.error('Failed to get cover art: %s', error)
-
-        newdata['artistwebsites'] = self._websites(
-            newdata['musicbrainzartistid'])
         return newdata
 
     def artistids(self, idlist):
@@ -261,15 +325,7 @@ class MusicBrainzHelper():
 
     def providerinfo(self):  # pylint: disable=no-self-use
         ''' return list of what is provided by this recognition system '''
-        return [
-            'album',
-            'artist',
-            'artistwebsites',
-            'coverimageraw',
-            'date',
-            'label',
-            'title',
-        ]
+        return PROVIDERINFO
 
 
 def main():
@@ -283,14 +339,11 @@ def main():
     nowplaying.config.ConfigFile(bundledir=bundledir)
     musicbrainz = MusicBrainzHelper(config=nowplaying.config.ConfigFile(
         bundledir=bundledir))
-    metadata = musicbrainz.recordingid(isrc)
+    metadata = musicbrainz.recordingid(isrc, need_art=False)
     if not metadata:
         print('No information')
         sys.exit(1)
 
-    if 'coverimageraw' in metadata:
-        print('got an image')
-        del metadata['coverimageraw']
     print(metadata)
 
 
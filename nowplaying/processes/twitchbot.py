@@ -49,7 +49,6 @@ logging.config.dictConfig({
 import nowplaying.bootstrap
 import nowplaying.config
 import nowplaying.db
-import nowplaying.version
 
 # 1. create a bot account, be sure to enable multiple logins per email
 # 2. enable 2FA
@@ -297,7 +296,7 @@ class TwitchBot(irc.bot.SingleServerIRCBot):  # pylint: disable=too-many-instanc
 
         if commands[0] == 'whatsnowplayingversion':
             inputsource = self.config.cparser.value('settings/input')
-            version = nowplaying.version.get_versions()['version']
+            version = nowplaying.__version__
             self._send_text(f'whatsnowplaying v{version} by @modernmeerkat. ' +
                             f'Using {inputsource} on {sys.platform}.')
             return
@@ -444,7 +443,10 @@ def start(stopevent, bundledir, testmode=False):  #pylint: disable=unused-argume
     config = nowplaying.config.ConfigFile(bundledir=bundledir)
     logging.info('boot up')
     twitchbot = TwitchBotHandler(stopevent=stopevent, config=config)  # pylint: disable=unused-variable
-    twitchbot.run()
+    try:
+        twitchbot.run()
+    finally:
+        nowplaying.bootstrap.stoplogging()
 
 
 def main():
@@ -537,4 +537,6 @@ def start(stopevent=None, bundledir=None, testmode=False):
     except Exception as error:  #pylint: disable=broad-except
         logging.error('Webserver crashed: %s', error, exc_info=True)
         sys.exit(1)
+    finally:
+        nowplaying.bootstrap.stoplogging()
     sys.exit(0)
@@ -47,8 +47,8 @@ class RecognitionPlugin():
 
 #### Recognition methods
 
-    def recognize(self, metadata=None):  #pylint: disable=no-self-use
-        ''' return metadata '''
+    def recognize(self, metadata=None, need_art=True):  #pylint: disable=no-self-use
+        ''' return metadata; need_art=False means cover art is not wanted '''
         raise NotImplementedError
 
     def providerinfo(self):
@@ -6,6 +6,7 @@ import copy
 import json
 import os
 import pathlib
+import random
 import subprocess
 import sys
 import time
@@ -19,6 +20,7 @@ from PySide6.QtWidgets import QFileDialog  # pylint: disable=no-name-in-module
 
 import acoustid
 
+import nowplaying.acoustidcache
 import nowplaying.bootstrap
 import nowplaying.config
 from nowplaying.recognition import RecognitionPlugin
@@ -28,22 +30,62 @@ import nowplaying.utils
 
 import nowplaying.version
 
+# recognize runs inside trackpoll, so keep the worst case
+# (about two seconds of sleeping) well under a track change
+ACOUSTID_MAX_RETRIES = 3
+ACOUSTID_BASE_BACKOFF = 0.5
+ACOUSTID_MAX_BACKOFF = 2.0
+
 
 class Plugin(RecognitionPlugin):
     ''' handler for acoustidmb '''
 
-    def __init__(self, config=None, qsettings=None):
+    def __init__(self, config=None, qsettings=None, cachedir=None):
         super().__init__(config=config, qsettings=qsettings)
         self.qwidget = None
         self.musicbrainz = nowplaying.musicbrainz.MusicBrainzHelper(
             self.config)
         self.acoustidmd = {}
         self.fpcalcexe = None
+        self.acoustidcache = None
+        self.cachedir = cachedir
+        # audioread + libchromaprint avoid spawning fpcalc for every file
+        self.inprocessfp = (getattr(acoustid, 'have_chromaprint', False)
+                            and getattr(acoustid, 'have_audioread', False))
 
     @staticmethod
-    def _fetch_from_acoustid(apikey, filename):  # pylint: disable=too-many-branches
+    def _lookup_with_backoff(apikey, fingerprint, duration):
+        ''' acoustid.lookup, backing off exponentially (with jitter)
+            while acoustid says we are being rate limited '''
         results = None
-        completedprocess = None
+        for attempt in range(ACOUSTID_MAX_RETRIES):
+            logging.debug('Performing acoustid lookup')
+            results = acoustid.lookup(apikey,
+                                      fingerprint,
+                                      duration,
+                                      meta=[
+                                          'recordings', 'recordingids',
+                                          'releases', 'tracks', 'usermeta'
+                                      ],
+                                      timeout=5)
+            if ('error' not in results
+                    or 'rate limit' not in results['error']['message']):
+                return results
+
+            if attempt < ACOUSTID_MAX_RETRIES - 1:
+                delay = min(ACOUSTID_MAX_BACKOFF, ACOUSTID_BASE_BACKOFF *
+                            2**attempt) * random.uniform(0.75, 1.25)
+                logging.debug(
+                    'acoustid complaining about rate limiting. Sleeping %.2fs then trying again.',
+                    delay)
+                time.sleep(delay)
+        logging.warning('acoustid is still rate limiting after %s attempts',
+                        ACOUSTID_MAX_RETRIES)
+        return results
+
+    @staticmethod
+    def _fpcalc(filename):
+        ''' run fpcalc and return its json output '''
         fpcalc = os.environ.get('FPCALC', 'fpcalc')
         command = [fpcalc, '-json', "-length", '120', filename]
         completedprocess = None
@@ -71,28 +113,55 @@ class Plugin(RecognitionPlugin):
         if not completedprocess or not completedprocess.stdout:
             return None
 
-        data = json.loads(completedprocess.stdout.decode('utf-8'))
+        return json.loads(completedprocess.stdout.decode('utf-8'))
+
+    def _fingerprint(self, filename):
+        ''' fingerprint with chromaprint in-process when possible,
+            otherwise fall back to fpcalc '''
+        if self.inprocessfp:
+            try:
+                duration, fingerprint = acoustid.fingerprint_file(
+                    filename, maxlength=120)
+                if isinstance(fingerprint, bytes):
+                    fingerprint = fingerprint.decode('utf-8')
+                return {'duration': duration, 'fingerprint': fingerprint}
+            except Exception as error:  # pylint: disable=broad-except
+                logging.debug('chromaprint failed on %s, trying fpcalc: %s',
+                              filename, error)
+        return self._fpcalc(filename)
+
+    def _getacoustidcache(self):
+        ''' the on-disk cache of fingerprints and lookups.  the test
+            suite must talk to acoustid unless it provides a cachedir '''
+        if not self.acoustidcache:
+            if self.config.testmode and not self.cachedir:
+                return None
+            self.acoustidcache = nowplaying.acoustidcache.AcoustidCache(
+                cachedir=self.cachedir)
+        return self.acoustidcache
+
+    def _fetch_from_acoustid(self, apikey, filename):
+        results = None
+        acoustidcache = self._getacoustidcache()
+
+        if acoustidcache and (cachedfp :=
+                              acoustidcache.get_fingerprint(filename)):
+            data = {'duration': cachedfp[0], 'fingerprint': cachedfp[1]}
+        elif data := self._fingerprint(filename):
+            if acoustidcache:
+                acoustidcache.put_fingerprint(filename, data['duration'],
+                                              data['fingerprint'])
+        else:
+            return None
+
+        if acoustidcache and (cachedresults := acoustidcache.get_lookup(
+                data['fingerprint'])) is not None:
+            logging.debug('Using cached acoustid results')
+            return cachedresults
 
         try:
-            counter = 0
-            while counter < 3:
-                logging.debug('Performing acoustid lookup')
-                results = acoustid.lookup(apikey,
-                                          data['fingerprint'],
-                                          data['duration'],
-                                          meta=[
-                                              'recordings', 'recordingids',
-                                              'releases', 'tracks', 'usermeta'
-                                          ],
-                                          timeout=5)
-                if ('error' not in results
-                        or 'rate limit' not in results['error']['message']):
-                    break
-                logging.info(
-                    'acoustid complaining about rate limiting. Sleeping then rying again.'
-                )
-                time.sleep(.5)
-                counter += 1
+            results = Plugin._lookup_with_backoff(apikey, data['fingerprint'],
+                                                  data['duration'])
         except acoustid.NoBackendError:
             results = None
             logging.error("chromaprint library/tool not found")
@@ -111,9 +180,14 @@ class Plugin(RecognitionPlugin):
                           results['error']['message'])
             return None
 
+        # don't remember misses; acoustid may learn about this track later
+        if acoustidcache and results['results']:
+            acoustidcache.put_lookup(data['fingerprint'], results['results'])
         return results['results']
 
-    def _read_acoustid_tuples(self, metadata, results):  # pylint: disable=too-many-branches, too-many-statements, too-many-locals
+    @staticmethod
+    def _read_acoustid_tuples(metadata, results):  # pylint: disable=too-many-branches, too-many-statements, too-many-locals
+        ''' return the best weighted match out of the acoustid results '''
         fnstr = nowplaying.utils.normalize(metadata['filename'])
         artist = metadata.get('artist')
         title = metadata.get('title')
@@ -137,6 +211,12 @@ class Plugin(RecognitionPlugin):
 
         logging.debug(results)
 
+        # best acoustid matches first so that equal weighted scores
+        # keep the more confident match
+        results = sorted(results,
+                         key=lambda result: result.get('score', 0),
+                         reverse=True)
+
         newdata = {}
         for result in results:  # pylint: disable=too-many-nested-blocks
             acoustidid = result['id']
@@ -157,11 +237,12 @@ class Plugin(RecognitionPlugin):
 
                 for release in recording['releases']:
                     if 'artists' in release:
-                        for artist in release['artists']:
-                            if 'name' in artist:
-                                albumartist = artist['name']
-                            elif isinstance(artist, str):
-                                albumartist = artist
+                        for releaseartist in release['artists']:
+                            albumartist = None
+                            if 'name' in releaseartist:
+                                albumartist = releaseartist['name']
+                            elif isinstance(releaseartist, str):
+                                albumartist = releaseartist
                             if albumartist == 'Various Artists':
                                 score = score - .10
                             elif albumartist and nowplaying.utils.normalize(
@@ -215,28 +296,19 @@ class Plugin(RecognitionPlugin):
                             newdata['musicbrainzartistid'] = artistidlist
                         lastscore = score
 
-        for key, value in newdata.items():
-            self.acoustidmd[key] = value
-
         logging.debug(
             'picked weighted score = %s, rid = %s, title = %s, artist = %s album = %s',
-            lastscore, self.acoustidmd.get('musicbrainzrecordingid'),
-            self.acoustidmd.get('title'), self.acoustidmd.get('artist'),
-            self.acoustidmd.get('album'))
+            lastscore, newdata.get('musicbrainzrecordingid'),
+            newdata.get('title'), newdata.get('artist'), newdata.get('album'))
+        return newdata
 
     def _configure_fpcalc(self, fpcalcexe=None):  # pylint: disable=too-many-return-statements
         ''' deal with all the potential issues of finding and running fpcalc '''
 
         if fpcalcexe and not os.environ.get("FPCALC"):
-            os.environ.setdefault("FPCALC", fpcalcexe)
             os.environ["FPCALC"] = fpcalcexe
 
-        try:
-            fpcalcexe = os.environ["FPCALC"]
-        except NameError:
-            logging.error('fpcalc is not configured')
-            return False
-
+        fpcalcexe = os.environ.get("FPCALC")
         if not fpcalcexe:
             logging.error('fpcalc is not configured')
             return False
@@ -271,7 +343,7 @@ class Plugin(RecognitionPlugin):
         self.fpcalcexe = fpcalcexe
         return True
 
-    def recognize(self, metadata=None):  #pylint: disable=too-many-statements
+    def recognize(self, metadata=None, need_art=True):  #pylint: disable=too-many-statements
         # we need to make sure we don't modify the passed
         # structure so do a deep copy here
         self.acoustidmd = copy.deepcopy(metadata)
@@ -286,8 +358,12 @@ class Plugin(RecognitionPlugin):
                 logging.warning('No filename in metadata')
                 return None
 
-            if not self._configure_fpcalc(fpcalcexe=self.config.cparser.value(
-                    'acoustidmb/fpcalcexe')):
+            # with chromaprint available, fpcalc is only a fallback
+            fpcalcexe = self.config.cparser.value('acoustidmb/fpcalcexe')
+            fpcalcready = False
+            if fpcalcexe or not self.inprocessfp:
+                fpcalcready = self._configure_fpcalc(fpcalcexe=fpcalcexe)
+            if not fpcalcready and not self.inprocessfp:
                 logging.error('fpcalc is not configured')
                 return None
 
@@ -299,7 +375,8 @@ class Plugin(RecognitionPlugin):
                     metadata['filename'])
                 return self.acoustidmd
 
-            self._read_acoustid_tuples(metadata, results)
+            self.acoustidmd.update(
+                self._read_acoustid_tuples(metadata, results))
 
         if not self.acoustidmd.get('musicbrainzrecordingid'):
             logging.info(
@@ -308,7 +385,7 @@ class Plugin(RecognitionPlugin):
             return self.acoustidmd
 
         if musicbrainzlookup := self.musicbrainz.recordingid(
-                self.acoustidmd['musicbrainzrecordingid']):
+                self.acoustidmd['musicbrainzrecordingid'], need_art=need_art):
             if self.acoustidmd.get(
                     'musicbrainzartistid') and musicbrainzlookup.get(
                         'musicbrainzartistid'):
@@ -391,7 +468,7 @@ class Plugin(RecognitionPlugin):
                 'Acoustid enabled, but no email address provided.')
 
         if qwidget.acoustid_checkbox.isChecked(
-        ) and not qwidget.fpcalcexe_lineedit.text():
+        ) and not qwidget.fpcalcexe_lineedit.text() and not self.inprocessfp:
             raise PluginVerifyError(
                 'Acoustid enabled, but no fpcalc binary provided.')
 
@@ -434,6 +511,7 @@ class Plugin(RecognitionPlugin):
         qsettings.setValue('acoustidmb/acoustidapikey', None)
         qsettings.setValue('acoustidmb/emailaddress', None)
         qsettings.setValue('acoustidmb/fpcalcexe', None)
+        qsettings.setValue('acoustidmb/fetchart', True)
         qsettings.setValue('acoustidmb/websites', False)
 
         for website in [
@@ -457,14 +535,11 @@ def main():
     # need to make sure config is initialized with something
     nowplaying.config.ConfigFile(bundledir=bundledir)
     plugin = Plugin()
-    metadata = plugin.recognize({'filename': filename})
+    metadata = plugin.recognize({'filename': filename}, need_art=False)
     if not metadata:
         print('No information')
         sys.exit(1)
 
-    if 'coverimageraw' in metadata:
-        print('got an image')
-        del metadata['coverimageraw']
     print(metadata)
 
 
@@ -828,6 +828,9 @@ class SettingsUI(QWidget):  # pylint: disable=too-many-public-methods
 
         self.config.unpause()
         self.upd_conf()
+        # the tray's file watch may never see this save (e.g., cfprefsd
+        # writes the plist lazily), so tell it directly
+        self.tray.configdirty = True
         self.close()
         self.tray.fix_mixmode_menu()
         self.tray.action_pause.setText('Pause')
@@ -2,27 +2,50 @@
 ''' system tray '''
 
 import logging
+import os
 
 from PySide6.QtWidgets import QApplication, QErrorMessage, QMenu, QMessageBox, QSystemTrayIcon  # pylint: disable=no-name-in-module
 from PySide6.QtGui import QAction, QActionGroup, QIcon  # pylint: disable=no-name-in-module
-from PySide6.QtCore import QFileSystemWatcher  # pylint: disable=no-name-in-module
+from PySide6.QtCore import QFileSystemWatcher, QObject, QThread, QTimer, Signal, Slot  # pylint: disable=no-name-in-module
 
+import nowplaying.bootstrap
 import nowplaying.config
 import nowplaying.db
 import nowplaying.settingsui
 import nowplaying.subprocesses
 import nowplaying.utils
-import nowplaying.version
 
-LASTANNOUNCED = {'artist': None, 'title': None}
+# collapse bursts of db writes into one read
+TRACKNOTIFY_DEBOUNCE_MS = 150
 
 
-class Tray:  # pylint: disable=too-many-instance-attributes
+class TrackNotifyWorker(QObject):
+    ''' read the latest track off of the GUI thread '''
+
+    ready = Signal(dict)
+
+    def __init__(self, metadb):
+        super().__init__()
+        self.metadb = metadb
+
+    @Slot()
+    def read(self):
+        ''' fetch the artist and title of the last track '''
+        if metadata := self.metadb.read_last_meta():
+            self.ready.emit({
+                'artist': metadata.get('artist'),
+                'title': metadata.get('title')
+            })
+
+
+class Tray(QObject):  # pylint: disable=too-many-instance-attributes
     ''' System Tray object '''
 
     def __init__(self):  #pylint: disable=too-many-statements
+        # a QObject so that the worker's results arrive on the GUI thread
+        super().__init__()
         self.config = nowplaying.config.ConfigFile()
-        self.version = nowplaying.version.get_versions()['version']
+        self.version = nowplaying.__version__
 
         self.icon = QIcon(str(self.config.iconfile))
         self.tray = QSystemTrayIcon()
@@ -76,16 +99,38 @@ class Tray:  # pylint: disable=too-many-instance-attributes
 
         self.fix_mixmode_menu()
 
-        self._check_for_upgrade_alert()
+        # the twitchbot needs its command entries before it starts
+        nowplaying.settingsui.update_twitchbot_commands(self.config)
 
         self.subprocesses.start_all_processes()
 
+        self._check_for_upgrade_alert()
+
         # Start the track notify handler
-        metadb = nowplaying.db.MetadataDB()
+        self.metadb = nowplaying.db.MetadataDB()
         self.watcher = QFileSystemWatcher()
-        self.watcher.addPath(str(metadb.databasefile))
+        self.watcher.addPath(str(self.metadb.databasefile))
         self.watcher.fileChanged.connect(self.tracknotify)
 
+        self.notifythread = QThread()
+        self.notifyworker = TrackNotifyWorker(self.metadb)
+        self.notifyworker.moveToThread(self.notifythread)
+        self.notifyworker.ready.connect(self.showtip)
+        self.notifytimer = QTimer()
+        self.notifytimer.setSingleShot(True)
+        self.notifytimer.setInterval(TRACKNOTIFY_DEBOUNCE_MS)
+        self.notifytimer.timeout.connect(self.notifyworker.read)
+        self.notifythread.start()
+
+        # only re-read the settings when they have actually changed.
+        # SettingsUI also sets configdirty when it saves since the
+        # watch cannot be trusted on every platform
+        self.configdirty = False
+        self.configwatcher = QFileSystemWatcher()
+        self.configwatcher.fileChanged.connect(self.configchanged)
+        self._watchconfig()
+        self.lastannounced = ('', '')
+
     def _configure_newold_menu(self):
         self.action_newestmode.setCheckable(True)
         self.action_newestmode.setEnabled(True)
@@ -104,19 +149,21 @@ class Tray:  # pylint: disable=too-many-instance-attributes
         self.action_pause.setEnabled(False)
 
     def _check_for_upgrade_alert(self):
-        nowplaying.settingsui.update_twitchbot_commands(self.config)
+        ''' let the user know what the upgrade changed without
+            holding up startup '''
+        messages = []
         if self.config.cparser.value('settings/newtemplates', type=bool):
-            self.regular_dialog.setText('Updated templates have been placed.')
+            messages.append('Updated templates have been placed.')
             self.config.cparser.setValue('settings/newtemplates', False)
-            self.regular_dialog.show()
-            self.regular_dialog.exec()
 
         if self.config.cparser.value('settings/newtwitchbot', type=bool):
-            self.regular_dialog.setText(
+            messages.append(
                 'Twitchbot permissions have been added or changed.')
             self.config.cparser.setValue('settings/newtwitchbot', False)
+
+        if messages:
+            self.regular_dialog.setText('\n\n'.join(messages))
             self.regular_dialog.show()
-            self.regular_dialog.exec()
 
     def webenable(self, status):
         ''' If the web server gets in trouble, we need to tell the user '''
@@ -180,46 +227,48 @@ class Tray:  # pylint: disable=too-many-instance-attributes
         self.config.setmixmode('newest')
         self.fix_mixmode_menu()
 
+    def _watchconfig(self):
+        ''' (re)watch the settings file; it may not exist yet and
+            QSettings may replace it, both of which drop the watch '''
+        path = self.config.cparser.fileName()
+        if path not in self.configwatcher.files() and os.path.exists(path):
+            self.configwatcher.addPath(path)
+
+    def configchanged(self, path):  # pylint: disable=unused-argument
+        ''' signal handler for the settings file changing '''
+        self.configdirty = True
+        self._watchconfig()
+
     def tracknotify(self):  # pylint: disable=unused-argument
         ''' signal handler to update the tooltip '''
-        global LASTANNOUNCED  # pylint: disable=global-statement, global-variable-not-assigned
+        if self.configdirty:
+            self.configdirty = False
+            self.config.get()
+            self._watchconfig()
 
-        self.config.get()
         if self.config.notif:
-            metadb = nowplaying.db.MetadataDB()
-            metadata = metadb.read_last_meta()
-            if not metadata:
-                return
-
-            # don't announce empty content
-            if not metadata['artist'] and not metadata['title']:
-                logging.warning(
-                    'Both artist and title are empty; skipping notify')
-                return
-
-            if 'artist' in metadata:
-                artist = metadata['artist']
-            else:
-                artist = ''
-
-            if 'title' in metadata:
-                title = metadata['title']
-            else:
-                title = ''
-
-            if metadata['artist'] == LASTANNOUNCED['artist'] and \
-               metadata['title'] == LASTANNOUNCED['title']:
-                return
-
-            LASTANNOUNCED['artist'] = metadata['artist']
-            LASTANNOUNCED['title'] = metadata['title']
-
-            tip = f'{artist} - {title}'
-            self.tray.setIcon(self.icon)
-            self.tray.showMessage('Now Playing ▶ ',
-                                  tip,
-                                  icon=QSystemTrayIcon.NoIcon)
-            self.tray.show()
+            # (re)start the countdown; the worker reads once it settles
+            self.notifytimer.start()
+
+    @Slot(dict)
+    def showtip(self, metadata):
+        ''' announce the track the worker found '''
+        key = (metadata.get('artist') or '', metadata.get('title') or '')
+        if key == self.lastannounced:
+            return
+
+        # don't announce empty content
+        if key == ('', ''):
+            logging.warning('Both artist and title are empty; skipping notify')
+            return
+
+        self.lastannounced = key
+        artist, title = key
+
+        tip = f'{artist} - {title}'
+        self.tray.showMessage('Now Playing ▶ ',
+                              tip,
+                              icon=QSystemTrayIcon.NoIcon)
 
     def cleanquit(self):
         ''' quit app and cleanup '''
@@ -227,6 +276,10 @@ class Tray:  # pylint: disable=too-many-instance-attributes
         logging.debug('Starting shutdown')
         self.tray.setVisible(False)
 
+        self.notifytimer.stop()
+        self.notifythread.quit()
+        self.notifythread.wait()
+
         self.subprocesses.stop_all_processes()
 
         if self.config:
@@ -235,6 +288,8 @@ class Tray:  # pylint: disable=too-many-instance-attributes
                 logging.debug('Writing empty file')
                 nowplaying.utils.writetxttrack(filename=self.config.file,
                                                clear=True)
+        logging.info('shutting down v%s', nowplaying.__version__)
+        nowplaying.bootstrap.stoplogging()
         app = QApplication.instance()
         app.exit(0)
 
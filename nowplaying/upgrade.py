@@ -4,6 +4,7 @@
 import hashlib
 import json
 import logging
+import os
 import pathlib
 import shutil
 import sys
@@ -13,7 +14,7 @@ import pkg_resources
 
 from PySide6.QtCore import QCoreApplication, QSettings, QStandardPaths  # pylint: disable=no-name-in-module
 
-import nowplaying.version
+import nowplaying
 
 
 class UpgradeConfig:
@@ -114,7 +115,7 @@ class UpgradeConfig:
         except TypeError:
             oldversstr = '2.0.0'
 
-        thisverstr = nowplaying.version.get_versions()['version']
+        thisverstr = nowplaying.__version__
         oldversion = pkg_resources.parse_version(oldversstr)
         thisversion = pkg_resources.parse_version(thisverstr)
 
@@ -211,10 +212,14 @@ class UpgradeTemplates():
 
         self.preload()
 
+        # one directory read instead of a stat() per template
+        with os.scandir(self.usertemplatedir) as entries:
+            existing = {entry.name for entry in entries}
+
         for apppath in pathlib.Path(self.apptemplatedir).iterdir():
             userpath = self.usertemplatedir.joinpath(apppath.name)
 
-            if not userpath.exists():
+            if apppath.name not in existing:
                 shutil.copyfile(apppath, userpath)
                 logging.info('Added %s to %s', apppath.name,
                              self.usertemplatedir)
@@ -235,7 +240,7 @@ class UpgradeTemplates():
 
             destpath = str(userpath).replace('.txt', '.new')
             destpath = pathlib.Path(destpath.replace('.htm', '.new'))
-            if destpath.exists():
+            if destpath.name in existing:
                 userhash = checksum(destpath)
                 if apphash == userhash:
                     continue
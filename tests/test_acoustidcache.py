@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+''' test acoustid cache '''
+
+import os
+import pathlib
+import sqlite3
+import tempfile
+
+import pytest
+
+import nowplaying.acoustidcache  # pylint: disable=import-error
+
+
+@pytest.fixture
+def get_acoustidcache():
+    ''' setup the acoustid cache for testing '''
+    with tempfile.TemporaryDirectory() as newpath:
+        yield nowplaying.acoustidcache.AcoustidCache(
+            cachedir=pathlib.Path(newpath))
+
+
+def test_fingerprint_roundtrip(get_acoustidcache):  # pylint: disable=redefined-outer-name
+    ''' a fingerprint is only returned for the same version of the file '''
+    acoustidcache = get_acoustidcache
+    filename = acoustidcache.cachedir.joinpath('song.mp3')
+    filename.write_bytes(b'one')
+
+    assert acoustidcache.get_fingerprint(filename) is None
+    acoustidcache.put_fingerprint(filename, 123.0, 'AQADtFmi')
+    assert acoustidcache.get_fingerprint(filename) == (123.0, 'AQADtFmi')
+
+    filename.write_bytes(b'changed')
+    assert acoustidcache.get_fingerprint(filename) is None
+
+
+def test_fingerprint_missingfile(get_acoustidcache):  # pylint: disable=redefined-outer-name
+    ''' missing files are never cached '''
+    acoustidcache = get_acoustidcache
+    filename = acoustidcache.cachedir.joinpath('missing.mp3')
+    acoustidcache.put_fingerprint(filename, 123.0, 'AQADtFmi')
+    assert acoustidcache.get_fingerprint(filename) is None
+
+
+def test_fingerprint_memory(get_acoustidcache):  # pylint: disable=redefined-outer-name
+    ''' repeat lookups are answered without sqlite '''
+    acoustidcache = get_acoustidcache
+    filename = acoustidcache.cachedir.joinpath('song.mp3')
+    filename.write_bytes(b'one')
+    acoustidcache.put_fingerprint(filename, 123.0, 'AQADtFmi')
+
+    with sqlite3.connect(acoustidcache.databasefile) as connection:
+        connection.execute('DELETE FROM fingerprints;')
+
+    assert acoustidcache.get_fingerprint(filename) == (123.0, 'AQADtFmi')
+
+
+def test_lookup_ttl(get_acoustidcache, monkeypatch):  # pylint: disable=redefined-outer-name
+    ''' lookups expire '''
+    acoustidcache = get_acoustidcache
+    results = [{'id': 'abc', 'score': 0.9}]
+
+    assert acoustidcache.get_lookup('AQADtFmi') is None
+    acoustidcache.put_lookup('AQADtFmi', results)
+    assert acoustidcache.get_lookup('AQADtFmi') == results
+
+    monkeypatch.setattr(nowplaying.acoustidcache, 'LOOKUP_TTL', -1)
+    assert acoustidcache.get_lookup('AQADtFmi') is None
+    monkeypatch.undo()
+    assert acoustidcache.get_lookup('AQADtFmi') is None
+    assert os.path.exists(acoustidcache.databasefile)
@@ -7,14 +7,14 @@ import pytest
 
 import nowplaying.recognition.acoustidmb  # pylint: disable=import-error
 
-if 'ACOUSTID_TEST_APIKEY' not in os.environ:
-    pytest.skip("skipping, ACOUSTID_TEST_APIKEY is not set",
-                allow_module_level=True)
+RATELIMITED = {'status': 'error', 'error': {'message': 'rate limit exceeded'}}
 
 
 @pytest.fixture
 def getacoustidmbplugin(bootstrap):
     ''' automated integration test '''
+    if 'ACOUSTID_TEST_APIKEY' not in os.environ:
+        pytest.skip("skipping, ACOUSTID_TEST_APIKEY is not set")
     config = bootstrap
     config.cparser.setValue('acoustidmb/enabled', True)
     config.cparser.setValue('musicbrainz/enabled', True)
@@ -62,3 +62,128 @@ def test_15ghosts2_fullytagged(getacoustidmbplugin, getroot):  # pylint: disable
     assert metadata[
         'musicbrainzrecordingid'] == '2d7f08e1-be1c-4b86-b725-6e675b7b6de0'
     assert metadata['title'] == '15 Ghosts II'
+
+
+@pytest.fixture
+def fake_lookup(monkeypatch):
+    ''' replace acoustid.lookup with canned responses and never sleep '''
+    calls = []
+    sleeps = []
+
+    def _install(responses):
+        def lookup(*args, **kwargs):  # pylint: disable=unused-argument
+            calls.append(args)
+            return responses[min(len(calls), len(responses)) - 1]
+
+        monkeypatch.setattr(nowplaying.recognition.acoustidmb.acoustid,
+                            'lookup', lookup)
+        monkeypatch.setattr(nowplaying.recognition.acoustidmb.time, 'sleep',
+                            sleeps.append)
+        return calls, sleeps
+
+    return _install
+
+
+def test_lookup_backoff_retry(fake_lookup):  # pylint: disable=redefined-outer-name
+    ''' a rate limited lookup is retried until acoustid answers '''
+    answer = {'status': 'ok', 'results': []}
+    calls, sleeps = fake_lookup([RATELIMITED, answer])
+    results = nowplaying.recognition.acoustidmb.Plugin._lookup_with_backoff(  # pylint: disable=protected-access
+        'apikey', 'AQADtFmi', 123)
+    assert results == answer
+    assert len(calls) == 2
+    assert len(sleeps) == 1
+
+
+def test_lookup_backoff_giveup(fake_lookup):  # pylint: disable=redefined-outer-name
+    ''' eventually give up, without sleeping past the retry budget '''
+    calls, sleeps = fake_lookup([RATELIMITED])
+    results = nowplaying.recognition.acoustidmb.Plugin._lookup_with_backoff(  # pylint: disable=protected-access
+        'apikey', 'AQADtFmi', 123)
+    assert results == RATELIMITED
+    assert len(calls) == nowplaying.recognition.acoustidmb.ACOUSTID_MAX_RETRIES
+    assert len(sleeps) == len(calls) - 1
+    assert max(sleeps) <= 1.25 * nowplaying.recognition.acoustidmb.ACOUSTID_MAX_BACKOFF
+
+
+def acoustid_result(acoustidid, score, artist, title):
+    ''' a canned acoustid result with one recording on one release '''
+    return {
+        'id':
+        acoustidid,
+        'score':
+        score,
+        'recordings': [{
+            'id':
+            f'{acoustidid}-rid',
+            'releases': [{
+                'title':
+                f'{title} album',
+                'artists': [{
+                    'name': artist
+                }],
+                'mediums': [{
+                    'tracks': [{
+                        'title': title,
+                        'artists': [{
+                            'name': artist,
+                            'id': f'{acoustidid}-artistid'
+                        }]
+                    }]
+                }]
+            }]
+        }]
+    }
+
+
+def test_read_acoustid_tuples_weighted():
+    ''' a match on the filename beats a higher raw acoustid score '''
+    metadata = {'filename': '/music/Nine Inch Nails - 15 Ghosts II.mp3'}
+    results = [
+        acoustid_result('other', 0.9, 'Someone Else', 'Other Song'),
+        acoustid_result('nin', 0.75, 'Nine Inch Nails', '15 Ghosts II'),
+    ]
+    newdata = nowplaying.recognition.acoustidmb.Plugin._read_acoustid_tuples(  # pylint: disable=protected-access
+        metadata, results)
+    assert newdata['acoustidid'] == 'nin'
+    assert newdata['musicbrainzrecordingid'] == 'nin-rid'
+    assert newdata['artist'] == 'Nine Inch Nails'
+    assert newdata['title'] == '15 Ghosts II'
+    assert newdata['album'] == '15 Ghosts II album'
+    assert newdata['musicbrainzartistid'] == ['nin-artistid']
+
+
+def test_read_acoustid_tuples_tie():
+    ''' on a tied weighted score, the higher acoustid score wins
+        no matter what order acoustid returned them in '''
+    metadata = {'filename': '/music/Nine Inch Nails - 15 Ghosts II.mp3'}
+    # 0.5 + 0.2 (album artist in filename) ties with a plain 0.7
+    results = [
+        acoustid_result('weighted', 0.5, 'Nine Inch Nails', 'Other Song'),
+        acoustid_result('confident', 0.7, 'Someone Else', 'Other Song'),
+    ]
+    newdata = nowplaying.recognition.acoustidmb.Plugin._read_acoustid_tuples(  # pylint: disable=protected-access
+        metadata, results)
+    assert newdata['musicbrainzrecordingid'] == 'confident-rid'
+    assert newdata['artist'] == 'Someone Else'
+
+    newdata = nowplaying.recognition.acoustidmb.Plugin._read_acoustid_tuples(  # pylint: disable=protected-access
+        metadata, list(reversed(results)))
+    assert newdata['musicbrainzrecordingid'] == 'confident-rid'
+
+
+def test_read_acoustid_tuples_norecordings():
+    ''' results without recordings are skipped '''
+    metadata = {'filename': '/music/Nine Inch Nails - 15 Ghosts II.mp3'}
+    results = [
+        {
+            'id': 'empty',
+            'score': 0.99
+        },
+        acoustid_result('nin', 0.5, 'Nine Inch Nails', '15 Ghosts II'),
+    ]
+    newdata = nowplaying.recognition.acoustidmb.Plugin._read_acoustid_tuples(  # pylint: disable=protected-access
+        metadata, results)
+    assert newdata['musicbrainzrecordingid'] == 'nin-rid'
+    assert not nowplaying.recognition.acoustidmb.Plugin._read_acoustid_tuples(  # pylint: disable=protected-access
+        metadata, [])
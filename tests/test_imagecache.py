@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 ''' test metadata DB '''
 
+import hashlib
 import logging
 import multiprocessing
 import pathlib
@@ -69,3 +70,134 @@ def test_imagecache(get_imagecache):  # pylint: disable=redefined-outer-name
         cachedimage = imagecache.cache[cachekey]
         if png == cachedimage:
             logging.debug('Found it at %s', cachekey)
+
+
+@pytest.fixture
+def get_offline_imagecache():
+    ''' an image cache without the download process '''
+    with tempfile.TemporaryDirectory() as newpath:
+        imagecache = nowplaying.imagecache.ImageCache(
+            cachedir=pathlib.Path(newpath),
+            stopevent=multiprocessing.Event())
+        yield imagecache
+        imagecache.stop_process()
+
+
+class FakeResponse:  # pylint: disable=too-few-public-methods
+    ''' just enough of a requests response for image_dl '''
+
+    def __init__(self, status_code, content=None):
+        self.status_code = status_code
+        self.content = content
+
+
+class FakeSession:  # pylint: disable=too-few-public-methods
+    ''' hand back canned responses by url '''
+
+    def __init__(self, responses):
+        self.responses = responses
+
+    def get(self, url, timeout=None):  # pylint: disable=unused-argument
+        ''' fake requests.get '''
+        return self.responses[url]
+
+
+def test_random_fetch(get_offline_imagecache):  # pylint: disable=redefined-outer-name
+    ''' only downloaded images of the right artist and type are picked '''
+    imagecache = get_offline_imagecache
+    imagecache.put_db_cachekey('Gary Numan', 'url1', 'artistfanart', 'key1')
+    imagecache.put_db_cachekey('Gary Numan', 'url2', 'artistfanart', 'key2')
+    imagecache.put_db_cachekey('Gary Numan', 'url3', 'artistlogo', 'key3')
+    imagecache.put_db_url('garynuman', 'url4', imagetype='artistfanart')
+
+    for _ in range(10):
+        data = imagecache.random_fetch('Gary Numan', 'artistfanart')
+        assert data['cachekey'] in ['key1', 'key2']
+
+    assert imagecache.random_fetch('Gary Numan', 'artistbanner') is None
+    assert imagecache.random_fetch('Tubeway Army', 'artistfanart') is None
+
+
+def test_erase_cachekey_requeue(get_offline_imagecache):  # pylint: disable=redefined-outer-name
+    ''' an image that fell out of the cache goes back into the queue '''
+    imagecache = get_offline_imagecache
+    workevent = imagecache._workevent  # pylint: disable=protected-access
+    imagecache.put_db_cachekey('Gary Numan', 'url1', 'artistfanart', 'key1')
+    assert not imagecache.get_next_dlset()
+
+    workevent.clear()
+    imagecache.erase_cachekey('key1')
+    assert workevent.is_set()
+    dataset = imagecache.get_next_dlset()
+    assert [entry['url'] for entry in dataset] == ['url1']
+    assert dataset[0]['cachekey'] is None
+
+    workevent.clear()
+    imagecache.erase_cachekey('notakey')
+    assert not workevent.is_set()
+
+
+def test_put_db_url_dedupe(get_offline_imagecache):  # pylint: disable=redefined-outer-name
+    ''' duplicate urls are ignored and do not wake the queue '''
+    imagecache = get_offline_imagecache
+    workevent = imagecache._workevent  # pylint: disable=protected-access
+
+    workevent.clear()
+    imagecache.put_db_url('garynuman', 'url1', imagetype='artistfanart')
+    assert workevent.is_set()
+
+    workevent.clear()
+    imagecache.put_db_url('garynuman', 'url1', imagetype='artistfanart')
+    assert not workevent.is_set()
+
+    imagecache.put_db_urls('garynuman', ['url1', 'url2', 'url2'],
+                           imagetype='artistfanart')
+    assert workevent.is_set()
+
+    workevent.clear()
+    imagecache.put_db_urls('garynuman', ['url1', 'url2'],
+                           imagetype='artistfanart')
+    assert not workevent.is_set()
+
+    assert sorted(entry['url']
+                  for entry in imagecache.get_next_dlset()) == ['url1', 'url2']
+
+
+def test_get_next_dlset_order(get_offline_imagecache):  # pylint: disable=redefined-outer-name
+    ''' thumbs, banners, and logos are downloaded ahead of fanart '''
+    imagecache = get_offline_imagecache
+    imagecache.put_db_url('garynuman', 'fanart1', imagetype='artistfanart')
+    imagecache.put_db_url('garynuman', 'thumb1', imagetype='artistthumb')
+    imagecache.put_db_url('garynuman', 'fanart2', imagetype='artistfanart')
+    imagecache.put_db_url('garynuman', 'logo1', imagetype='artistlogo')
+
+    imagetypes = [entry['imagetype'] for entry in imagecache.get_next_dlset()]
+    assert sorted(imagetypes[:2]) == ['artistlogo', 'artistthumb']
+    assert imagetypes[2:] == ['artistfanart', 'artistfanart']
+
+
+def test_image_dl_cachekey(get_offline_imagecache):  # pylint: disable=redefined-outer-name
+    ''' the same image from two urls is only stored once '''
+    imagecache = get_offline_imagecache
+    png = b'\211PNG\r\n\032\n' + b'not really a png'
+    imagecache.session = FakeSession({
+        'url1': FakeResponse(200, png),
+        'url2': FakeResponse(200, png),
+        'url3': FakeResponse(404),
+    })
+
+    for url in ['url1', 'url2', 'url3']:
+        imagecache.put_db_url('garynuman', url, imagetype='artistfanart')
+        imagecache.image_dl({
+            'artist': 'garynuman',
+            'url': url,
+            'imagetype': 'artistfanart'
+        })
+
+    cachekey = hashlib.blake2b(png, digest_size=16).hexdigest()
+    assert list(imagecache.cache.iterkeys()) == [cachekey]
+    assert imagecache.cache[cachekey] == png
+    assert imagecache.find_url('url1')['cachekey'] == cachekey
+    assert imagecache.find_url('url2')['cachekey'] == cachekey
+    assert imagecache.find_url('url3') is None
+    assert not imagecache.get_next_dlset()